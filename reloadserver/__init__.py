@@ -1,6 +1,7 @@
 import http.server, http, pathlib, sys, argparse, ssl, builtins, contextlib, \
-    threading, os
-from typing import BinaryIO
+    threading, os, time, json, struct, uuid, queue, random, datetime, \
+    functools, collections, marshal, tracemalloc
+from typing import BinaryIO, Iterable
 
 # Does not seem to do be used, but leaving this import out causes uploadserver
 # to not receive IPv4 requests when started with default options under Windows
@@ -29,49 +30,592 @@ poll()
 </script>
 '''
 
-reload_signal = threading.Condition()
-debounce_timer = None
+BROADCAST_DEFAULT = '239.255.82.83:8765'
+# Remote reloads are dropped if every path in them was already reloaded here
+# recently, so overlapping watch trees only reload once. The window is twice
+# the longer of this instance's and the sender's debounce intervals, plus this
+# many seconds for delivery
+BROADCAST_DUPLICATE_SLACK = 1
+# Longest debounce interval in ms accepted from other instances
+BROADCAST_MAX_DEBOUNCE_INTERVAL = 60*60*1000
+# Largest UDP payload. Bigger path lists are sent as a bare reload instead
+BROADCAST_MAX_MESSAGE = 65507
 
-def reload():
-    global debounce_timer
-    if debounce_timer is not None:
-        debounce_timer.cancel()
+# Records waiting for the --async-log writer. When full, records are dropped
+# instead of stalling request handling
+LOG_QUEUE_SIZE = 10000
+# Same escaping http.server applies to text log lines, so request lines cannot
+# inject terminal escape sequences. Built here because older Python 3.10
+# releases lack http.server's table
+LOG_ESCAPES = str.maketrans({ c: '\\x{:02x}'.format(c) for c in [*range(0x20),
+    *range(0x7f, 0xa0)] })
+LOG_ESCAPES[ord('\\')] = '\\\\'
+TIMINGS = ['queue', 'handshake', 'injection', 'send']
 
-    with reload_signal:
-        reload_signal.notify_all()
+# Seconds between stack samples while profiling
+PROFILE_INTERVAL = 0.005
+# Frames kept per allocation by tracemalloc, and allocation sites reported
+PROFILE_TRACEBACK_LIMIT = 10
+PROFILE_TOP_ALLOCATIONS = 20
 
-def set_reload_timer():
-    global debounce_timer
-    if debounce_timer is not None:
-        debounce_timer.cancel()
+broadcast_bus = None
+access_log = None
+profiler = None
+# Available with --profiling. While running, a background thread samples the
+# stacks of every thread (including idle ones, so this is wall-clock time),
+# functions marked @profiled record their own call times, and tracemalloc
+# tracks allocations. Results are kept until the next start()
+class Profiler:
+    def __init__(self):
+        self.control_lock = threading.Lock()
+        self.data_lock = threading.Lock()
+        self.thread = None
+        self.reset()
     
-    debounce_timer = threading.Timer(args.debounce_interval / 1000, reload)
-    debounce_timer.start()
+    @property
+    def running(self) -> bool:
+        return self.thread is not None
+    
+    # Called with control_lock held, except from __init__()
+    def reset(self) -> None:
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self.stack_seconds = collections.Counter()
+        self.hooks = {}
+        self.snapshot = None
+    
+    def start(self) -> None:
+        with self.control_lock:
+            if self.running: return
+            
+            with self.data_lock: self.reset()
+            tracemalloc.start(PROFILE_TRACEBACK_LIMIT)
+            self.stopping = threading.Event()
+            self.thread = threading.Thread(target=self.sample,
+                args=(self.stopping,), daemon=True)
+            self.thread.start()
+    
+    def stop(self) -> None:
+        with self.control_lock:
+            if not self.running: return
+            
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+            self.snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+    
+    def sample(self, stopping: threading.Event) -> None:
+        sampler = threading.get_ident()
+        last = time.perf_counter()
+        
+        while not stopping.wait(PROFILE_INTERVAL):
+            stacks = []
+            for thread, frame in sys._current_frames().items():
+                if thread == sampler: continue
+                
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno,
+                        code.co_name))
+                    frame = frame.f_back
+                stacks.append(tuple(reversed(stack)))
+            
+            # Walking many threads' stacks takes time too, so the real period
+            # is longer than PROFILE_INTERVAL
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            
+            with self.data_lock:
+                self.samples += 1
+                self.stacks.update(stacks)
+                for stack in stacks: self.stack_seconds[stack] += elapsed
+    
+    def record(self, hook: str, seconds: float) -> None:
+        with self.data_lock:
+            calls, total, longest = self.hooks.get(hook, (0, 0, 0))
+            self.hooks[hook] = (calls + 1, total + seconds,
+                max(longest, seconds))
+    
+    # One line per stack, root first, for flamegraph.pl and similar tools
+    def collapsed(self) -> bytes:
+        with self.data_lock: stacks = list(self.stacks.items())
+        
+        return ''.join('{} {}\n'.format(';'.join('{} ({}:{})'.format(name,
+            os.path.basename(filename), line) for filename, line, name in stack),
+            count) for stack, count in stacks).encode()
+    
+    # Builds the same marshalled dict that pstats.Stats.dump_stats() writes,
+    # from the samples instead of from cProfile (which only sees one thread).
+    # Call counts are sample counts, and times are the measured time between
+    # samples
+    def pstats(self) -> bytes:
+        with self.data_lock:
+            stacks = [(stack, count, self.stack_seconds[stack])
+                for stack, count in self.stacks.items()]
+        
+        stats = {}
+        for stack, count, seconds in stacks:
+            seen = set()
+            
+            for i, function in enumerate(stack):
+                entry = stats.setdefault(function, [0, 0, 0, 0, {}])
+                leaf = i == len(stack) - 1
+                
+                # Recursive functions only count once toward cumulative time
+                if function not in seen:
+                    seen.add(function)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if leaf: entry[2] += seconds
+                
+                if i > 0:
+                    caller = entry[4].setdefault(stack[i - 1], [0, 0, 0, 0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[3] += seconds
+                    if leaf: caller[2] += seconds
+        
+        return marshal.dumps({ function: (cc, nc, tt, ct, { caller: tuple(
+            timing) for caller, timing in callers.items() }) for function,
+            (cc, nc, tt, ct, callers) in stats.items() })
+    
+    def summary(self) -> dict:
+        # Held so stop() cannot end tracing between the check and the snapshot
+        with self.control_lock:
+            running = self.running
+            snapshot = self.snapshot
+            if running:
+                snapshot = tracemalloc.take_snapshot()
+        
+        allocations = []
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            for statistic in snapshot.statistics('lineno')[
+                :PROFILE_TOP_ALLOCATIONS]:
+                frame = statistic.traceback[0]
+                allocations.append({ 'file': frame.filename,
+                    'line': frame.lineno, 'size': statistic.size,
+                    'count': statistic.count })
+        
+        with self.data_lock:
+            return {
+                'running': running,
+                'samples': self.samples,
+                'interval_ms': PROFILE_INTERVAL*1000,
+                'hooks': { hook: { 'calls': calls,
+                    'total_ms': round(total*1000, 3),
+                    'max_ms': round(longest*1000, 3) } for hook,
+                    (calls, total, longest) in self.hooks.items() },
+                'allocations': allocations,
+            }
+
+# Times a hot path function while the profiler is running
+def profiled(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if profiler is None or not profiler.running:
+            return function(*args, **kwargs)
+        
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.record(function.__qualname__, time.perf_counter() - start)
+    
+    return wrapper
+
+# Sorted longest prefix first, so the most specific mount matches a URL
+mounts = []
+
+# A URL prefix served from a directory. Each mount has its own watch patterns,
+# debounce timer and reload channel, so a change in one mount only reloads
+# clients of that mount
+class Mount:
+    def __init__(self, prefix: str, directory: str, watch: list[str],
+        ignore: list[str]):
+        self.prefix = normalize_prefix(prefix)
+        self.directory = os.path.abspath(directory)
+        self.watch = watch
+        self.ignore = ignore
+        self.script_tag = SCRIPT_TAG.replace(b'/api-reloadserver/',
+            self.prefix.encode() + b'/api-reloadserver/')
+        
+        self.reload_signal = threading.Condition()
+        self.debounce_timer = None
+        
+        # Paths seen by this process's observer, waiting for the debounce
+        # timer. Only these are broadcast, and only these are remembered as
+        # recently reloaded. Remembering paths from other instances would drop
+        # the next real change to the same file on a --blind instance
+        self.pending_lock = threading.Lock()
+        self.pending_paths = set()
+        self.recent_reloads = {}
+        self.duplicate_window = duplicate_window(args.debounce_interval)
+    
+    @profiled
+    def reload(self, announce: bool = False) -> None:
+        with self.pending_lock:
+            if self.debounce_timer is not None:
+                self.debounce_timer.cancel()
+            
+            local_paths = set(self.pending_paths)
+            now = time.monotonic()
+            for path in self.pending_paths:
+                self.recent_reloads[path] = now
+            for path, last in list(self.recent_reloads.items()):
+                if now - last > self.duplicate_window:
+                    del self.recent_reloads[path]
+            
+            self.pending_paths.clear()
+        
+        with self.reload_signal:
+            self.reload_signal.notify_all()
+        
+        # Announcing this mount's directory lets other instances reload only
+        # their mounts that contain it
+        if announce: local_paths.add(self.directory)
+        if broadcast_bus is not None and local_paths:
+            broadcast_bus.send(local_paths)
+    
+    @profiled
+    def set_reload_timer(self, paths: Iterable[str] = ()) -> None:
+        with self.pending_lock:
+            self.pending_paths.update(paths)
+            
+            if self.debounce_timer is not None:
+                self.debounce_timer.cancel()
+            
+            self.debounce_timer = threading.Timer(
+                args.debounce_interval / 1000, self.reload)
+            self.debounce_timer.start()
+    
+    # For reloads from other instances. Dropped if this process's own observer
+    # already has every path pending or recently reloaded
+    def receive(self, paths: set[str], debounce_interval: int) -> None:
+        if paths:
+            window = duplicate_window(debounce_interval)
+            
+            with self.pending_lock:
+                # Kept for pruning, so a slow peer's duplicates are still known
+                self.duplicate_window = max(self.duplicate_window, window)
+                
+                now = time.monotonic()
+                if all(path in self.pending_paths or (
+                    path in self.recent_reloads and
+                    now - self.recent_reloads[path] < window)
+                    for path in paths):
+                    return
+        
+        self.set_reload_timer()
+    
+    def contains(self, path: str) -> bool:
+        return path == self.directory or path.startswith(
+            os.path.join(self.directory, ''))
+
+def duplicate_window(debounce_interval: int) -> float:
+    return BROADCAST_DUPLICATE_SLACK + 2*max(args.debounce_interval,
+        debounce_interval)/1000
+
+# '/a/', 'a' and '/a' all become '/a'. The root is ''
+def normalize_prefix(prefix: str) -> str:
+    return ('/' + prefix.strip('/')).rstrip('/')
+
+def find_mount(path: str) -> tuple[Mount | None, str]:
+    url_path = path.split('?', 1)[0].split('#', 1)[0]
+    
+    for mount in mounts:
+        if url_path == mount.prefix or url_path.startswith(mount.prefix + '/'):
+            return mount, path[len(mount.prefix):]
+    
+    return None, path
+
+def reload() -> None:
+    for mount in mounts: mount.reload()
+    
+    if broadcast_bus is not None: broadcast_bus.send([])
 
 class WatchdogHandler(watchdog.events.PatternMatchingEventHandler):
-    def on_modified(self, event) -> None: set_reload_timer()
-    def on_created (self, event) -> None: set_reload_timer()
-    def on_deleted (self, event) -> None: set_reload_timer()
-    def on_moved   (self, event) -> None: set_reload_timer()
+    def __init__(self, mount: Mount, **kwargs):
+        super().__init__(**kwargs)
+        self.mount = mount
+    
+    def on_modified(self, event) -> None: self.changed(event)
+    def on_created (self, event) -> None: self.changed(event)
+    def on_deleted (self, event) -> None: self.changed(event)
+    def on_moved   (self, event) -> None: self.changed(event)
+    
+    @profiled
+    def changed(self, event: watchdog.events.FileSystemEvent) -> None:
+        # Absolute paths, so instances started from different folders agree
+        paths = [os.path.abspath(event.src_path)]
+        if getattr(event, 'dest_path', ''):
+            paths.append(os.path.abspath(event.dest_path))
+        
+        self.mount.set_reload_timer(paths)
+
+# Shares reloads between reloadserver instances on one host or LAN over UDP
+# multicast. Each message carries the sender's id, debounce interval and the
+# changed paths. An empty path list means a reload with no known cause (such as
+# from the API)
+class BroadcastBus:
+    def __init__(self, group: str, port: int):
+        self.group = group
+        self.port = port
+        self.id = uuid.uuid4().hex
+        
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+            socket.IPPROTO_UDP)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # macOS and the BSDs also need this for several processes on one port
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.socket.bind(('', port))
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+            struct.pack('4s4s', socket.inet_aton(group),
+            socket.inet_aton('0.0.0.0')))
+        # Loopback is needed for instances on the same host to hear each other
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        
+        threading.Thread(target=self.listen, daemon=True).start()
+    
+    def send(self, paths: Iterable[str]) -> None:
+        message = { 'origin': self.id,
+            'debounce_interval': args.debounce_interval, 'paths': sorted(paths) }
+        if len(json.dumps(message)) > BROADCAST_MAX_MESSAGE:
+            message['paths'] = []
+        message = json.dumps(message)
+        
+        try:
+            self.socket.sendto(message.encode(), (self.group, self.port))
+        except OSError as e:
+            print('WARNING: Could not broadcast reload: {}'.format(e))
+    
+    # Anyone on the LAN can send to the group, so anything malformed is dropped
+    # and the loop must survive it
+    def listen(self) -> None:
+        while True:
+            try:
+                data, _ = self.socket.recvfrom(BROADCAST_MAX_MESSAGE)
+                message = json.loads(data)
+            except (OSError, ValueError):
+                continue
+            
+            if not isinstance(message, dict): continue
+            origin = message.get('origin')
+            paths = message.get('paths')
+            debounce_interval = message.get('debounce_interval',
+                args.debounce_interval)
+            
+            if not isinstance(origin, str) or not isinstance(paths, list) or \
+                not all(isinstance(path, str) for path in paths) or \
+                type(debounce_interval) is not int or not 0 <= \
+                debounce_interval <= BROADCAST_MAX_DEBOUNCE_INTERVAL:
+                continue
+            
+            if origin != self.id: self.receive(set(paths), debounce_interval)
+    
+    # Paths go to the mounts containing them. Changes outside every mount (such
+    # as from a server for a sibling folder) reload all mounts
+    def receive(self, paths: set[str], debounce_interval: int) -> None:
+        routed = { mount: { path for path in paths if mount.contains(path) }
+            for mount in mounts }
+        if not any(routed.values()):
+            routed = dict.fromkeys(mounts, paths)
+        
+        for mount, mine in routed.items():
+            if mine or not paths: mount.receive(mine, debounce_interval)
+
+# Replaces http.server's access log when any --log-* option is given. Records
+# are dicts, formatted by whichever thread writes them. With --async-log they
+# are queued for a background thread that writes everything waiting in one
+# batch, so a slow stderr reader never blocks request handling
+class AccessLog:
+    def __init__(self, format: str, level: str, sample: float, buffered: bool):
+        self.format = format
+        self.level = level
+        self.sample = sample
+        
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.queue = None
+        if buffered:
+            self.queue = queue.Queue(LOG_QUEUE_SIZE)
+            threading.Thread(target=self.run, daemon=True).start()
+    
+    def wants(self, error: bool) -> bool:
+        if error: return True
+        return self.level == 'all' and (self.sample >= 1 or
+            random.random() < self.sample)
+    
+    def put(self, record: dict) -> None:
+        if self.queue is None:
+            self.write([record])
+            return
+        
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.dropped_lock: self.dropped += 1
+    
+    def run(self) -> None:
+        while True:
+            records = [self.queue.get()]
+            with contextlib.suppress(queue.Empty):
+                while True: records.append(self.queue.get_nowait())
+            
+            with self.dropped_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                records.append({ 'time': time.time(), 'message': '{} log '
+                    'records dropped, log queue full'.format(dropped),
+                    'dropped': dropped })
+            
+            self.write(records)
+    
+    def write(self, records: list[dict]) -> None:
+        lines = [self.format_record(record) for record in records]
+        
+        with contextlib.suppress(OSError, ValueError):
+            sys.stderr.write(''.join(lines))
+            sys.stderr.flush()
+    
+    def format_record(self, record: dict) -> str:
+        if self.format == 'json':
+            record = dict(record, time=datetime.datetime.fromtimestamp(
+                record['time']).astimezone().isoformat(timespec='milliseconds'))
+            return json.dumps(record) + '\n'
+        
+        # Same layout as http.server's log_message()
+        return '{} - - [{}] {}\n'.format(record.get('client', '-'),
+            time.strftime('%d/%b/%Y %H:%M:%S', time.localtime(record['time'])),
+            record['message'].translate(LOG_ESCAPES) if 'message' in record
+            else '"{}" {} {}'.format(record['request'].translate(LOG_ESCAPES),
+            record['status'], record['size']))
 
 class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Set by parse_request(). Errors sent before then have no mount
+    mount = None
+    mount_path = None
+    
     # To be used only on .html files, to inject the script tag
+    @profiled
     def copyfile_interceptor(self, source: BinaryIO, outputfile: BinaryIO
         ) -> None:
+        start = time.perf_counter()
+        
         before_inject = source.read()
         if b'</html>' not in before_inject:
             print('WARNING: No closing </html> tag, reload script will be '
                 'injected at end of file')
-            outputfile.write(before_inject + SCRIPT_TAG)
+            after_inject = before_inject + self.mount.script_tag
         else:
-            outputfile.write(before_inject.replace(
-                b'</html>', SCRIPT_TAG + b'</html>'))
-
+            after_inject = before_inject.replace(
+                b'</html>', self.mount.script_tag + b'</html>')
+        
+        injected = time.perf_counter()
+        outputfile.write(after_inject)
+        
+        self.timings['injection'] = injected - start
+        self.timings['send'] = time.perf_counter() - injected
+    
+    def copyfile(self, source: BinaryIO, outputfile: BinaryIO) -> None:
+        start = time.perf_counter()
+        super().copyfile(source, outputfile)
+        self.timings['send'] = time.perf_counter() - start
+    
+    def setup(self) -> None:
+        super().setup()
+        
+        # Queue and handshake times are recorded by the server when
+        # structured logging is on, and belong to the connection's first
+        # request
+        accepted = getattr(self.server, 'accept_timings', {}).pop(
+            self.request, None)
+        self.connection_timings = {}
+        if accepted is not None:
+            self.connection_timings = {
+                'queue': time.perf_counter() - accepted['accepted'],
+                'handshake': accepted['handshake'],
+            }
+    
+    def handle_one_request(self) -> None:
+        self.timings, self.connection_timings = self.connection_timings, {}
+        self.log_record = None
+        start = time.perf_counter()
+        
+        try:
+            super().handle_one_request()
+        finally:
+            # Logged here instead of in log_request(), which runs before the
+            # body is sent. Still logged if sending fails
+            if self.log_record is not None:
+                for timing in TIMINGS:
+                    if timing in self.timings:
+                        self.log_record[timing + '_ms'] = round(
+                            self.timings[timing]*1000, 3)
+                self.log_record['duration_ms'] = round(
+                    (time.perf_counter() - start)*1000, 3)
+                access_log.put(self.log_record)
+    
+    def log_request(self, code: int | str = '-', size: int | str = '-'
+        ) -> None:
+        if access_log is None:
+            super().log_request(code, size)
+            return
+        
+        if isinstance(code, http.HTTPStatus): code = code.value
+        if not access_log.wants(isinstance(code, int) and code >= 400): return
+        
+        self.log_record = {
+            'time': time.time(),
+            'client': self.address_string(),
+            'method': self.command,
+            'path': self.path,
+            'request': self.requestline,
+            'status': code,
+            'size': size,
+        }
     
+    def log_error(self, format: str, *args) -> None:
+        if access_log is None:
+            super().log_error(format, *args)
+            return
+        
+        access_log.put({
+            'time': time.time(),
+            'client': self.address_string(),
+            'message': format % args,
+        })
+    
+    def parse_request(self) -> bool:
+        if not super().parse_request(): return False
+        
+        self.mount, self.mount_path = find_mount(self.path)
+        return True
+    
+    def translate_path(self, path: str) -> str:
+        # http.server passes self.path, already matched by parse_request()
+        mount, mount_path = (self.mount, self.mount_path) if path == \
+            self.path else find_mount(path)
+        
+        # No file exists at '', so send_head() answers 404
+        if mount is None: return ''
+        
+        self.directory = mount.directory
+        return super().translate_path(mount_path)
+    
+    @profiled
     def flush_headers(self) -> None:
         update_content_length = False
         
-        if hasattr(self, '_headers_buffer'):
+        if hasattr(self, '_headers_buffer') and self.mount is not None:
             for header in self._headers_buffer:
                 if header[:13] == b'Content-type:' and b'text/html' in header:
                     setattr(self, 'copyfile', self.copyfile_interceptor)
@@ -82,7 +626,7 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         if update_content_length:
             for i, header in enumerate(self._headers_buffer):
                 if header[:15] == b'Content-Length:':
-                    length = int(header[15:]) + len(SCRIPT_TAG)
+                    length = int(header[15:]) + len(self.mount.script_tag)
                     
                     # Use same encoding that self.send_header() uses
                     self._headers_buffer[i] = 'Content-Length: {}\r\n'.format(
@@ -90,25 +634,82 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         
         super().flush_headers()
     
+    def send_body(self, body: bytes, content_type: str,
+        filename: str | None = None) -> None:
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if filename is not None:
+            self.send_header('Content-Disposition',
+                'attachment; filename="{}"'.format(filename))
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_GET(self) -> None:
-        if self.path == '/api-reloadserver/wait-for-reload':
-            with reload_signal: reload_signal.wait()
+        if self.path == '/api-reloadserver/trigger-reload':
+            self.send_response(http.HTTPStatus.METHOD_NOT_ALLOWED)
+            self.end_headers()
+        elif profiler is not None and self.path == '/api-reloadserver/profile':
+            self.send_body(json.dumps(profiler.summary()).encode(),
+                'application/json')
+        elif profiler is not None and self.path == \
+            '/api-reloadserver/profile/pstats':
+            self.send_body(profiler.pstats(), 'application/octet-stream',
+                'reloadserver.pstats')
+        elif profiler is not None and self.path == \
+            '/api-reloadserver/profile/collapsed':
+            self.send_body(profiler.collapsed(), 'text/plain; charset=utf-8',
+                'reloadserver.collapsed')
+        elif profiler is not None and self.path in [
+            '/api-reloadserver/profile/start', '/api-reloadserver/profile/stop']:
+            self.send_response(http.HTTPStatus.METHOD_NOT_ALLOWED)
+            self.end_headers()
+        elif self.mount is None:
+            self.send_error(http.HTTPStatus.NOT_FOUND, 'No mount for this path')
+        elif self.mount_path == '/api-reloadserver/wait-for-reload':
+            with self.mount.reload_signal: self.mount.reload_signal.wait()
 
             self.send_response(http.HTTPStatus.NO_CONTENT)
             self.end_headers()
-        elif self.path == '/api-reloadserver/trigger-reload':
+        elif self.mount_path == '/api-reloadserver/trigger-reload':
             self.send_response(http.HTTPStatus.METHOD_NOT_ALLOWED)
             self.end_headers()
         else:
             super().do_GET()
     
+    def do_HEAD(self) -> None:
+        if self.mount is None:
+            self.send_error(http.HTTPStatus.NOT_FOUND, 'No mount for this path')
+        else:
+            super().do_HEAD()
+    
     def do_POST(self) -> None:
+        # The top-level endpoint reloads every mount
         if self.path == '/api-reloadserver/trigger-reload':
             reload()
 
             self.send_response(http.HTTPStatus.NO_CONTENT)
             self.end_headers()
-        elif self.path == '/api-reloadserver/wait-for-reload':
+        elif profiler is not None and self.path == \
+            '/api-reloadserver/profile/start':
+            profiler.start()
+
+            self.send_response(http.HTTPStatus.NO_CONTENT)
+            self.end_headers()
+        elif profiler is not None and self.path == \
+            '/api-reloadserver/profile/stop':
+            profiler.stop()
+
+            self.send_response(http.HTTPStatus.NO_CONTENT)
+            self.end_headers()
+        elif self.mount is None:
+            self.send_error(http.HTTPStatus.NOT_FOUND, 'No mount for this path')
+        elif self.mount_path == '/api-reloadserver/trigger-reload':
+            self.mount.reload(announce=True)
+
+            self.send_response(http.HTTPStatus.NO_CONTENT)
+            self.end_headers()
+        elif self.mount_path == '/api-reloadserver/wait-for-reload':
             self.send_response(http.HTTPStatus.METHOD_NOT_ALLOWED)
             self.end_headers()
         else:
@@ -141,8 +742,27 @@ def ssl_wrap(socket) -> None:
         print('SSL error: "{}", exiting'.format(e))
         sys.exit(5)
 
+def parse_mount(value: str) -> dict:
+    # PREFIX=DIRECTORY[,watch=PATTERN][,ignore=PATTERN]...
+    fields = value.split(',')
+    prefix, sep, directory = fields[0].partition('=')
+    if not sep or not directory:
+        raise argparse.ArgumentTypeError('expected PREFIX=DIRECTORY, got "{}"'
+            .format(fields[0]))
+    
+    mount = { 'prefix': prefix, 'directory': directory, 'watch': [],
+        'ignore': [] }
+    for field in fields[1:]:
+        key, sep, pattern = field.partition('=')
+        if key not in ['watch', 'ignore'] or not sep:
+            raise argparse.ArgumentTypeError('unknown mount option "{}"'.format(
+                field))
+        mount[key].append(pattern)
+    
+    return mount
+
 def main() -> None:
-    global args
+    global args, broadcast_bus, access_log, profiler
     
     parser = argparse.ArgumentParser()
     parser.add_argument('port', type=int, default=8000, nargs='?',
@@ -167,6 +787,38 @@ def main() -> None:
         'Overrides --watch and --ignore [default: false]')
     parser.add_argument('--debounce-interval', '-D', type=int, default=500,
         help='Minimum time in ms between reloads [default: 500, minimum: 10]')
+    parser.add_argument('--broadcast', metavar='GROUP:PORT', nargs='?',
+        const=BROADCAST_DEFAULT,
+        help='Share reloads with other reloadservers using the same multicast '
+        'group and port. Reloads already seen from overlapping watch trees are '
+        'suppressed [default: off, or {} if given without a value]'.format(
+        BROADCAST_DEFAULT))
+    parser.add_argument('--async-log', action='store_true', default=False,
+        help='Write the access log from a background thread in batches. If '
+        'the log falls too far behind, records are dropped instead of slowing '
+        'requests [default: false]')
+    parser.add_argument('--log-format', choices=['text', 'json'],
+        default='text',
+        help='Access log format. json writes one object per line, with timing '
+        'fields in ms [default: text]')
+    parser.add_argument('--log-level', choices=['all', 'errors'],
+        default='all',
+        help='Log all requests, or only errors and responses with status 400+ '
+        '[default: all]')
+    parser.add_argument('--log-sample', metavar='FRACTION', type=float,
+        default=1,
+        help='Fraction of non-error requests to log [default: 1]')
+    parser.add_argument('--profiling', action='store_true', default=False,
+        help='Enable the /api-reloadserver/profile endpoints, to profile this '
+        'server while it runs. Profiling only starts when requested '
+        '[default: false]')
+    parser.add_argument('--mount', '-m', metavar='PREFIX=DIRECTORY[,OPTION]',
+        type=parse_mount, action='append', default=[],
+        help='Serve DIRECTORY at URL PREFIX, with its own reload channel. '
+        'Accepts watch=PATTERN and ignore=PATTERN options, which replace '
+        '--watch and --ignore for that directory. Can be given several times. '
+        'All mounts share one server and one file watcher [default: serve . at '
+        '/]')
     args = parser.parse_args()
 
     if args.debounce_interval < 10:
@@ -174,23 +826,69 @@ def main() -> None:
             '--debounce-interval)')
         exit(1)
     
-    ignore_patterns = args.ignore
-    # Watchdog's ignore patterns are bizarre, undocumented, and on Windows
-    # trying to ignore dotfiles causes all events to be ignored
-    if not args.skip_built_in_ignores and os.name != 'nt':
-        ignore_patterns += ['.*', '__pycache__/*', 'node_modules/*']
+    if not 0 <= args.log_sample <= 1:
+        print('ERROR: Log sample must be between 0 and 1 (--log-sample)')
+        exit(1)
+    
+    if args.async_log or args.log_format != 'text' or args.log_level != 'all' \
+        or args.log_sample < 1:
+        access_log = AccessLog(args.log_format, args.log_level,
+            args.log_sample, args.async_log)
+    
+    if args.profiling:
+        profiler = Profiler()
+    
+    if args.broadcast:
+        group, _, port = args.broadcast.rpartition(':')
+        
+        try:
+            broadcast_bus = BroadcastBus(group, int(port))
+        except (ValueError, OSError) as e:
+            print('ERROR: Could not join broadcast group "{}" (--broadcast): {}'
+                .format(args.broadcast, e))
+            exit(1)
+    
+    for mount in args.mount or [{ 'prefix': '/', 'directory': '.',
+        'watch': [], 'ignore': [] }]:
+        if not os.path.isdir(mount['directory']):
+            print('ERROR: Mount directory "{}" not found (-m, --mount)'.format(
+                mount['directory']))
+            exit(1)
+        
+        prefix = normalize_prefix(mount['prefix'])
+        if any(prefix == existing.prefix for existing in mounts):
+            print('ERROR: Mount prefix "{}/" given more than once (-m, --mount)'
+                .format(prefix))
+            exit(1)
+        
+        ignore_patterns = mount['ignore'] or list(args.ignore)
+        # Watchdog's ignore patterns are bizarre, undocumented, and on Windows
+        # trying to ignore dotfiles causes all events to be ignored
+        if not args.skip_built_in_ignores and os.name != 'nt':
+            ignore_patterns += ['.*', '__pycache__/*', 'node_modules/*']
+        
+        mounts.append(Mount(mount['prefix'], mount['directory'],
+            mount['watch'] or args.watch, ignore_patterns))
+    
+    mounts.sort(key=lambda mount: len(mount.prefix), reverse=True)
     
     if not args.blind:
         observer = watchdog.observers.Observer()
-        observer.schedule(WatchdogHandler(
-            patterns=args.watch,
-            ignore_patterns=ignore_patterns,
-            ignore_directories=True,
-            case_sensitive=True,
-        ), path='.', recursive=True)
+        for mount in mounts:
+            observer.schedule(WatchdogHandler(
+                mount,
+                patterns=mount.watch,
+                ignore_patterns=mount.ignore,
+                ignore_directories=True,
+                case_sensitive=True,
+            ), path=mount.directory, recursive=True)
         observer.start()
     
     class DualStackServer(http.server.ThreadingHTTPServer):
+        def __init__(self, *args, **kwargs):
+            self.accept_timings = {}
+            super().__init__(*args, **kwargs)
+        
         def server_bind(self):
             # suppress exception when protocol is IPv4
             with contextlib.suppress(Exception):
@@ -200,6 +898,23 @@ def main() -> None:
             if args.certificate:
                 self.socket = ssl_wrap(self.socket)
             return bind
+        
+        # With HTTPS, the TLS handshake happens inside accept()
+        def get_request(self):
+            start = time.perf_counter()
+            request, client_address = super().get_request()
+            
+            if access_log is not None:
+                self.accept_timings[request] = {
+                    'accepted': time.perf_counter(),
+                    'handshake': time.perf_counter() - start,
+                }
+            
+            return request, client_address
+    
+    if args.mount:
+        for mount in reversed(mounts):
+            print('Serving {} at {}/'.format(mount.directory, mount.prefix))
     
     print('Modify a watched file or POST to /api-reloadserver/trigger-reload '
         'to reload clients')
@@ -1,4 +1,4 @@
-import os, subprocess, time, urllib3, threading
+import os, subprocess, time, urllib3, threading, json, pstats, socket, ssl
 from pathlib import Path
 
 import pytest, requests
@@ -39,7 +39,6 @@ def setup_function():
 @pytest.fixture(autouse=True)
 def try_a_fixture(request):
     shell_args = ['python3', '-u', '-m', 'reloadserver']
-    if PROTOCOL == 'HTTPS': shell_args += ['-c', '../server.pem']
     
     port = None
     
@@ -56,19 +55,14 @@ def try_a_fixture(request):
         if 'blind' in kwargs: shell_args += ['--blind']
         if 'debounce_interval' in kwargs: shell_args += ['-D'] + \
             kwargs['debounce_interval']
+        if 'broadcast' in kwargs: shell_args += ['--broadcast'] + \
+            kwargs['broadcast']
+        if 'profiling' in kwargs: shell_args += ['--profiling']
+        for mount in kwargs.get('mount', []):
+            os.makedirs(mount.split('=')[1].split(',')[0], exist_ok=True)
+            shell_args += ['-m', mount]
     
-    server = subprocess.Popen(shell_args)
-    
-    # Wait for server to finish starting
-    for _ in range(100):
-        try:
-            get('/', port=port or 8000)
-            break
-        except requests.exceptions.ConnectionError:
-            time.sleep(0.01)
-    else:
-        server.terminate()
-        raise Exception('Port {} not responding. Did the server fail to start?'.format(port or 8000))
+    server = start_server(shell_args, port=port or 8000)
     
     yield
     
@@ -450,6 +444,411 @@ def test_content_length_rewriting_does_NOT_spill_over():
     assert int(res.headers['Content-Length']) == 13
     assert res.text == '<html></html>'
 
+@pytest.mark.fixture_args(broadcast=[], debounce_interval=['10'])
+def test_broadcast():
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '--blind'], port=8001)
+    
+    try:
+        thread = threading.Thread(target=wait_for_reload, kwargs={ 'port': 8001 })
+        thread.start()
+        
+        time.sleep(0.1)
+        with lock: assert wait_for_reload_responses[0] is None
+        
+        with open('some-file', 'w') as f: f.write('foo')
+        thread.join(2)
+        with lock: assert wait_for_reload_responses[0] == 204
+    finally:
+        other.terminate()
+
+# Anyone on the LAN can send to the group, so junk must not stop the listener
+@pytest.mark.fixture_args(broadcast=[], debounce_interval=['10'])
+def test_broadcast_bad_messages():
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '--blind', '-D', '10'], port=8001)
+    
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for message in [b'not json', b'[]', b'{}', b'{"origin": 1, '
+                b'"paths": []}', b'{"origin": "x", "paths": "abc"}',
+                b'{"origin": "x", "paths": [1]}', b'{"origin": "x", "paths": '
+                b'[], "debounce_interval": "10"}']:
+                s.sendto(message, ('239.255.82.83', 8765))
+        time.sleep(0.1) # Let any reloads from the junk finish first
+        
+        thread = threading.Thread(target=wait_for_reload, kwargs={ 'port': 8001 })
+        thread.start()
+        
+        time.sleep(0.1)
+        with lock: assert wait_for_reload_responses[0] is None
+        
+        with open('some-file', 'w') as f: f.write('foo')
+        thread.join(2)
+        with lock: assert wait_for_reload_responses[0] == 204
+    finally:
+        other.terminate()
+
+@pytest.mark.fixture_args(broadcast=[], debounce_interval=['10'])
+def test_broadcast_by_api():
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '--blind'], port=8001)
+    
+    try:
+        thread = threading.Thread(target=wait_for_reload)
+        thread.start()
+        
+        time.sleep(0.1)
+        with lock: assert wait_for_reload_responses[0] is None
+        
+        assert post('/api-reloadserver/trigger-reload', port=8001
+            ).status_code == 204
+        thread.join(2)
+        with lock: assert wait_for_reload_responses[0] == 204
+    finally:
+        other.terminate()
+
+# Two servers watching the same folder both see the change, so each should
+# ignore the other's broadcast instead of reloading twice
+@pytest.mark.fixture_args(broadcast=[], debounce_interval=['10'])
+def test_broadcast_duplicates_suppressed():
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '-D', '10'], port=8001)
+    
+    try:
+        thread = threading.Thread(target=wait_for_two_reloads,
+            kwargs={ 'port': 8001 })
+        thread.start()
+        
+        time.sleep(0.1)
+        with lock: assert wait_for_reload_responses[0] is None
+        
+        with open('some-file', 'w') as f: f.write('foo')
+        time.sleep(0.5)
+        with lock:
+            assert wait_for_reload_responses[0] == 204
+            assert wait_for_reload_responses[1] is None
+        
+        assert post('/api-reloadserver/trigger-reload', port=8001
+            ).status_code == 204
+        thread.join(2)
+        with lock: assert wait_for_reload_responses[1] == 204
+    finally:
+        other.terminate()
+
+# The slower server's broadcast arrives long after this one reloaded, but is
+# still a duplicate
+@pytest.mark.fixture_args(broadcast=[], debounce_interval=['10'])
+def test_broadcast_duplicates_suppressed_long_debounce():
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '-D', '1500'], port=8001)
+    
+    try:
+        thread = threading.Thread(target=wait_for_two_reloads)
+        thread.start()
+        
+        time.sleep(0.1)
+        with lock: assert wait_for_reload_responses[0] is None
+        
+        with open('some-file', 'w') as f: f.write('foo')
+        time.sleep(2)
+        with lock:
+            assert wait_for_reload_responses[0] == 204
+            assert wait_for_reload_responses[1] is None
+        
+        assert post('/api-reloadserver/trigger-reload').status_code == 204
+        thread.join(2)
+        with lock: assert wait_for_reload_responses[1] == 204
+    finally:
+        other.terminate()
+
+# Errors sent before the request is parsed (and so before a mount is found)
+# had crashed the handler
+def test_request_line_too_long():
+    assert get('/' + 'a'*70000).status_code == 414
+
+# A --blind server remembering reloads it received would drop the next real
+# change to the same file
+@pytest.mark.fixture_args(broadcast=[], debounce_interval=['10'])
+def test_broadcast_same_file_twice():
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '--blind', '-D', '10'], port=8001)
+    
+    try:
+        thread = threading.Thread(target=wait_for_two_reloads,
+            kwargs={ 'port': 8001 })
+        thread.start()
+        
+        time.sleep(0.1)
+        with lock: assert wait_for_reload_responses[0] is None
+        
+        with open('some-file', 'w') as f: f.write('foo')
+        time.sleep(0.5)
+        with lock:
+            assert wait_for_reload_responses[0] == 204
+            assert wait_for_reload_responses[1] is None
+        
+        with open('some-file', 'w') as f: f.write('bar')
+        thread.join(2)
+        with lock: assert wait_for_reload_responses[1] == 204
+    finally:
+        other.terminate()
+
+# Servers for sibling folders share no paths, but should still reload together
+@pytest.mark.fixture_args(broadcast=[], debounce_interval=['10'])
+def test_broadcast_separate_folders():
+    os.makedirs('project-b', exist_ok=True)
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '-D', '10', '-m', '/=project-b'], port=8001)
+    
+    try:
+        thread = threading.Thread(target=wait_for_reload, kwargs={ 'port': 8001 })
+        thread.start()
+        
+        time.sleep(0.1)
+        with lock: assert wait_for_reload_responses[0] is None
+        
+        with open('some-file', 'w') as f: f.write('foo')
+        thread.join(2)
+        with lock: assert wait_for_reload_responses[0] == 204
+    finally:
+        other.terminate()
+
+@pytest.mark.fixture_args(mount=['/a=project-a', '/b=project-b'])
+def test_mount():
+    with open('project-a/test.html', 'w') as f: f.write('<html></html>')
+    
+    res = get('/a/test.html')
+    assert res.status_code == 200
+    assert int(res.headers['Content-Length']) == len(res.content)
+    assert "fetch('/a/api-reloadserver/wait-for-reload'" in res.text
+    
+    assert get('/b/test.html').status_code == 404
+    assert get('/test.html').status_code == 404
+
+@pytest.mark.fixture_args(mount=['/a=project-a', '/b=project-b'],
+    debounce_interval=['10'])
+def test_mount_reload_channels():
+    threads = [
+        threading.Thread(target=wait_for_reload, kwargs={ 'path': '/a' }),
+        threading.Thread(target=wait_for_reload, kwargs={ 'index': 1,
+            'path': '/b' }),
+    ]
+    for thread in threads: thread.start()
+    
+    time.sleep(0.1)
+    with lock:
+        assert wait_for_reload_responses[0] is None
+        assert wait_for_reload_responses[1] is None
+    
+    with open('project-b/some-file', 'w') as f: f.write('foo')
+    threads[1].join(2)
+    time.sleep(0.1)
+    with lock:
+        assert wait_for_reload_responses[0] is None
+        assert wait_for_reload_responses[1] == 204
+    
+    assert post('/a/api-reloadserver/trigger-reload').status_code == 204
+    threads[0].join(2)
+    with lock: assert wait_for_reload_responses[0] == 204
+
+@pytest.mark.fixture_args(mount=['/a=project-a', '/b=project-b'])
+def test_mount_trigger_reload_all():
+    threads = [
+        threading.Thread(target=wait_for_reload, kwargs={ 'path': '/a' }),
+        threading.Thread(target=wait_for_reload, kwargs={ 'index': 1,
+            'path': '/b' }),
+    ]
+    for thread in threads: thread.start()
+    
+    time.sleep(0.1)
+    with lock:
+        assert wait_for_reload_responses[0] is None
+        assert wait_for_reload_responses[1] is None
+    
+    assert post('/api-reloadserver/trigger-reload').status_code == 204
+    for thread in threads: thread.join(2)
+    with lock:
+        assert wait_for_reload_responses[0] == 204
+        assert wait_for_reload_responses[1] == 204
+
+# Other instances should only reload their mounts for the same directory
+@pytest.mark.fixture_args(mount=['/a=project-a', '/b=project-b'],
+    broadcast=[], debounce_interval=['10'])
+def test_mount_broadcast():
+    other = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--broadcast', '--blind', '-m', '/a=project-a', '-m', '/b=project-b'],
+        port=8001)
+    
+    try:
+        threads = [
+            threading.Thread(target=wait_for_reload, kwargs={ 'port': 8001,
+                'path': '/a' }),
+            threading.Thread(target=wait_for_reload, kwargs={ 'index': 1,
+                'port': 8001, 'path': '/b' }),
+        ]
+        for thread in threads: thread.start()
+        
+        time.sleep(0.1)
+        with lock:
+            assert wait_for_reload_responses[0] is None
+            assert wait_for_reload_responses[1] is None
+        
+        assert post('/a/api-reloadserver/trigger-reload').status_code == 204
+        threads[0].join(2)
+        time.sleep(0.1)
+        with lock:
+            assert wait_for_reload_responses[0] == 204
+            assert wait_for_reload_responses[1] is None
+        
+        assert post('/b/api-reloadserver/trigger-reload', port=8001
+            ).status_code == 204
+        threads[1].join(2)
+        with lock: assert wait_for_reload_responses[1] == 204
+    finally:
+        other.terminate()
+
+def test_mount_duplicate_prefix():
+    os.makedirs('project-a', exist_ok=True)
+    
+    assert subprocess.run(['python3', '-m', 'reloadserver', '8001', '-m',
+        '/a=project-a', '-m', '/a/=.'], stdout=subprocess.DEVNULL,
+        timeout=5).returncode == 1
+
+@pytest.mark.fixture_args(mount=['/=.', '/a=project-a,watch=*.js'],
+    debounce_interval=['10'])
+def test_mount_watch():
+    thread = threading.Thread(target=wait_for_reload, kwargs={ 'path': '/a' })
+    thread.start()
+    
+    time.sleep(0.1)
+    with lock: assert wait_for_reload_responses[0] is None
+    
+    with open('project-a/some-ignored-markup.html', 'w') as f: f.write('foo')
+    time.sleep(0.1)
+    with lock: assert wait_for_reload_responses[0] is None
+    
+    with open('project-a/some-watched-script.js', 'w') as f: f.write('foo')
+    thread.join(2)
+    with lock: assert wait_for_reload_responses[0] == 204
+
+def test_log_json():
+    with open('test.html', 'w') as f: f.write('<html></html>')
+    
+    server = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--async-log', '--log-format', 'json'], port=8001,
+        stderr=subprocess.PIPE)
+    
+    assert get('/test.html', port=8001).status_code == 200
+    assert get('/missing.html', port=8001).status_code == 404
+    time.sleep(0.1)
+    server.terminate()
+    records = [json.loads(line) for line in server.communicate()[1].splitlines()]
+    
+    html = [record for record in records if record.get('path') == '/test.html']
+    assert len(html) == 1
+    assert html[0]['method'] == 'GET'
+    assert html[0]['status'] == 200
+    for field in ['queue_ms', 'handshake_ms', 'injection_ms', 'send_ms',
+        'duration_ms']:
+        assert html[0][field] >= 0
+    
+    assert [record['status'] for record in records
+        if record.get('path') == '/missing.html'] == [404]
+
+def test_log_errors_only():
+    server = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--async-log', '--log-level', 'errors'], port=8001,
+        stderr=subprocess.PIPE)
+    
+    for _ in range(5): assert get('/', port=8001).status_code == 200
+    assert get('/missing.html', port=8001).status_code == 404
+    time.sleep(0.1)
+    server.terminate()
+    log = server.communicate()[1].decode()
+    
+    assert '"GET / HTTP/1.1" 200' not in log
+    assert '"GET /missing.html HTTP/1.1" 404' in log
+
+def test_log_sample():
+    server = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--log-sample', '0'], port=8001, stderr=subprocess.PIPE)
+    
+    for _ in range(5): assert get('/', port=8001).status_code == 200
+    assert get('/missing.html', port=8001).status_code == 404
+    time.sleep(0.1)
+    server.terminate()
+    log = server.communicate()[1].decode()
+    
+    assert '"GET / HTTP/1.1" 200' not in log
+    assert '"GET /missing.html HTTP/1.1" 404' in log
+
+# Control characters must be escaped, as http.server's own log does, so a
+# request line cannot inject terminal escape sequences
+def test_log_escapes_control_characters():
+    server = start_server(['python3', '-u', '-m', 'reloadserver', '8001',
+        '--async-log'], port=8001, stderr=subprocess.PIPE)
+    
+    assert raw_request(b'GET /\x1b[2Jx HTTP/1.0\r\n\r\n', port=8001
+        ).startswith(b'HTTP/1.0 404')
+    time.sleep(0.1)
+    server.terminate()
+    log = server.communicate()[1].decode()
+    
+    assert '\x1b' not in log
+    assert '"GET /\\x1b[2Jx HTTP/1.0" 404' in log
+
+def test_profile_disabled():
+    assert get('/api-reloadserver/profile').status_code == 404
+    assert post('/api-reloadserver/profile/start').status_code == 404
+
+@pytest.mark.fixture_args(profiling=True)
+def test_profile_bad_method():
+    assert get('/api-reloadserver/profile/start').status_code == 405
+    assert get('/api-reloadserver/profile/stop').status_code == 405
+
+@pytest.mark.fixture_args(profiling=True, debounce_interval=['10'])
+def test_profile():
+    with open('test.html', 'w') as f: f.write('<html></html>')
+    
+    assert get('/api-reloadserver/profile').json()['running'] == False
+    assert post('/api-reloadserver/profile/start').status_code == 204
+    
+    assert get('/test.html').status_code == 200
+    with open('some-file', 'w') as f: f.write('foo')
+    time.sleep(0.2)
+    
+    summary = get('/api-reloadserver/profile').json()
+    assert summary['running'] == True
+    assert summary['samples'] > 0
+    for hook in ['SimpleHTTPRequestHandler.copyfile_interceptor',
+        'SimpleHTTPRequestHandler.flush_headers', 'WatchdogHandler.changed',
+        'Mount.set_reload_timer', 'Mount.reload']:
+        assert summary['hooks'][hook]['calls'] >= 1
+    
+    assert post('/api-reloadserver/profile/stop').status_code == 204
+    summary = get('/api-reloadserver/profile').json()
+    assert summary['running'] == False
+    assert len(summary['allocations']) > 0
+    
+    res = get('/api-reloadserver/profile/collapsed')
+    assert res.status_code == 200
+    for line in res.text.splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+    assert 'sample (__init__.py:' not in res.text
+    
+    res = get('/api-reloadserver/profile/pstats')
+    assert res.status_code == 200
+    with open('profile.pstats', 'wb') as f: f.write(res.content)
+    stats = pstats.Stats('profile.pstats')
+    assert stats.total_tt > 0
+    serve_forever = [timing for (_, _, name), timing in stats.stats.items()
+        if name == 'serve_forever']
+    assert len(serve_forever) == 1
+    # The main thread was in serve_forever() for the whole 0.2 s sleep
+    assert serve_forever[0][3] >= 0.15
+
 def test_curl_example():
     thread = threading.Thread(target=wait_for_reload)
     thread.start()
@@ -482,11 +881,43 @@ def post(path: str | bytes, port: int = 8000, *args, **kwargs
     return requests.post('{}://127.0.0.1:{}{}'.format(PROTOCOL.lower(), port,
         path), verify=False, *args, **kwargs)
 
-def wait_for_reload(index: int = 0) -> None:
-    res = get('/api-reloadserver/wait-for-reload')
+def start_server(shell_args: list[str], port: int = 8000, **kwargs
+    ) -> subprocess.Popen:
+    if PROTOCOL == 'HTTPS': shell_args = shell_args + ['-c', '../server.pem']
+    server = subprocess.Popen(shell_args, **kwargs)
+    
+    # Wait for server to finish starting
+    for _ in range(100):
+        try:
+            get('/', port=port)
+            break
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.01)
+    else:
+        server.terminate()
+        raise Exception('Port {} not responding. Did the server fail to start?'.format(port))
+    
+    return server
+
+# For requests that requests would refuse to send or would escape
+def raw_request(data: bytes, port: int = 8000) -> bytes:
+    with socket.create_connection(('127.0.0.1', port)) as s:
+        if PROTOCOL == 'HTTPS':
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            s = context.wrap_socket(s)
+        
+        s.sendall(data)
+        response = b''
+        while chunk := s.recv(65536): response += chunk
+        return response
+
+def wait_for_reload(index: int = 0, port: int = 8000, path: str = '') -> None:
+    res = get(path + '/api-reloadserver/wait-for-reload', port=port)
     with lock: wait_for_reload_responses[index] = res.status_code
 
-def wait_for_two_reloads() -> None:
+def wait_for_two_reloads(port: int = 8000) -> None:
     for i in range(2):
-        res = get('/api-reloadserver/wait-for-reload')
+        res = get('/api-reloadserver/wait-for-reload', port=port)
         with lock: wait_for_reload_responses[i] = res.status_code